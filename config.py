@@ -1,17 +1,38 @@
 from pathlib import Path
-from typing import Dict, Literal
+from typing import Dict, List, Literal, Tuple
+import functools
 import os
+import re
+import stat
 import sys
+import time
 
 Permission = Literal["ro", "rw"]
 
+# Validation cache bounds: entries expire after this many seconds so a path
+# that changes on disk (e.g. a file swapped for a symlink after approval) is
+# re-checked promptly, and the cache is emptied once it reaches this size.
+_VALIDATE_CACHE_TTL = 5.0
+_VALIDATE_CACHE_MAX = 1024
+
+# Matches one "path:permission" entry; entries are comma-separated. Lazy path
+# match plus the trailing lookahead keeps rsplit semantics for paths that
+# contain colons (e.g. C:\path on Windows).
+_ENTRY_RE = re.compile(r"\s*([^,]+?):(ro|rw)\s*(?=,|$)")
+
 class Config:
     """Parse and validate filesystem access configuration."""
 
     def __init__(self):
         self.allowed_paths: Dict[Path, Permission] = {}
+        self._allowed_prefixes: List[Tuple[str, str, Path, Permission]] = []
         self._parse_allowed_paths()
         self._parse_size_limits()
+        # Memoize validation: tool calls hit the same paths repeatedly, and
+        # allowed_paths is fixed for the process lifetime. Only successes are
+        # stored, and only for _VALIDATE_CACHE_TTL seconds — an approval must
+        # not outlive the filesystem state (symlink swaps) it was based on.
+        self._validate_cache: Dict[Tuple[str, bool], Tuple[float, Path]] = {}
 
     def _parse_allowed_paths(self):
         """Parse ALLOWED_PATHS environment variable."""
@@ -19,25 +40,26 @@ class Config:
         if not paths_env:
             raise ValueError("ALLOWED_PATHS environment variable required")
 
-        for entry in paths_env.split(","):
-            entry = entry.strip()
-            if not entry:
-                continue
-
-            if ":" not in entry:
-                raise ValueError(f"Invalid entry (missing :permission): {entry}")
-
-            # Use rsplit to split from right, handling paths that might contain colons (e.g., C:\path on Windows)
-            path_str, permission = entry.rsplit(":", 1)
+        # Single regex pass extracts every (path, permission) pair; anything
+        # the regex didn't consume (besides separators) is a malformed entry
+        pos = 0
+        for match in _ENTRY_RE.finditer(paths_env):
+            gap = paths_env[pos:match.start()].strip(", \t")
+            if gap:
+                raise ValueError(f"Invalid entry (missing :permission): {gap}")
+            pos = match.end()
 
-            if permission not in ["ro", "rw"]:
-                raise ValueError(f"Invalid permission '{permission}' (must be ro or rw)")
+            path_str, permission = match.groups()
 
-            path = Path(path_str).expanduser().resolve()
+            # realpath + one stat covers resolve/exists/is_dir in a single
+            # syscall per entry
+            path = Path(os.path.realpath(os.path.expanduser(path_str)))
 
-            if not path.exists():
+            try:
+                st = os.stat(path)
+            except OSError:
                 raise ValueError(f"Path does not exist: {path}")
-            if not path.is_dir():
+            if not stat.S_ISDIR(st.st_mode):
                 raise ValueError(f"Path is not a directory: {path}")
 
             if path in self.allowed_paths:
@@ -45,15 +67,36 @@ class Config:
 
             self.allowed_paths[path] = permission
 
+        tail = paths_env[pos:].strip(", \t")
+        if tail:
+            raise ValueError(f"Invalid entry (missing :permission): {tail}")
+
         if not self.allowed_paths:
             raise ValueError("No valid paths in ALLOWED_PATHS")
 
+        # Precompute string prefixes so validate_path can check containment
+        # with a single startswith per allowed dir instead of relative_to().
+        # A root dir already ends with the separator ("/", "C:\\"); appending
+        # another would make the prefix match nothing.
+        for path, permission in self.allowed_paths.items():
+            exact = str(path)
+            prefix = exact if exact.endswith(os.sep) else exact + os.sep
+            self._allowed_prefixes.append((prefix, exact, path, permission))
+
+        # Pre-render the allowed-path list once: the denial message
+        # shouldn't re-format it on every rejected request
+        self._allowed_list_msg = ", ".join(
+            exact for _, exact, _, _ in self._allowed_prefixes
+        )
+
     def _parse_size_limits(self):
         """Parse size limit configuration."""
         self.no_size_limit = os.getenv("NO_SIZE_LIMIT", "").lower() == "true"
 
         if self.no_size_limit:
             self.max_file_size_bytes = None
+            self.max_file_size_mb = None
+            self.size_limit_desc = "DISABLED"
         else:
             max_mb_str = os.getenv("MAX_FILE_SIZE_MB", "10")
             try:
@@ -65,6 +108,9 @@ class Config:
                 raise ValueError(f"MAX_FILE_SIZE_MB must be positive, got: {max_mb}")
 
             self.max_file_size_bytes = max_mb * 1024 * 1024
+            # Kept as an int so error messages never re-derive it by division
+            self.max_file_size_mb = max_mb
+            self.size_limit_desc = f"{max_mb}MB"
 
     def validate_path(self, path_str: str, require_write: bool = False) -> Path:
         """Validate path is within allowed directories with correct permissions.
@@ -81,9 +127,49 @@ class Config:
             PermissionError: Path outside allowed dirs or insufficient permissions
             FileNotFoundError: Path doesn't exist (when require_write=False)
         """
+        key = (path_str, require_write)
+        now = time.monotonic()
+        hit = self._validate_cache.get(key)
+        if hit is not None and now - hit[0] < _VALIDATE_CACHE_TTL:
+            return hit[1]
+
+        result = self._validate_path_uncached(path_str, require_write)
+
+        if len(self._validate_cache) >= _VALIDATE_CACHE_MAX:
+            self._validate_cache.clear()
+        self._validate_cache[key] = (now, result)
+        return result
+
+    @staticmethod
+    def _reject_symlinks(path_obj: Path):
+        """Refuse paths with a symlink anywhere in their components.
+
+        lstat on the original components (before resolve() erases the
+        evidence) closes the hole where a symlink inside an allowed dir
+        points through or at disallowed locations, and skips the realpath
+        walk for rejected paths. Components that don't exist yet (write
+        targets) are simply skipped.
+        """
+        probe = Path(os.path.abspath(path_obj))
+        for candidate in (probe, *probe.parents):
+            try:
+                st = os.lstat(candidate)
+            except OSError:
+                continue
+            if stat.S_ISLNK(st.st_mode):
+                raise PermissionError(
+                    f"Access denied: '{candidate}' is a symlink"
+                )
+
+    def _validate_path_uncached(self, path_str: str, require_write: bool) -> Path:
+        """Uncached implementation behind validate_path's LRU cache."""
         # Resolve to absolute path, following symlinks
         path_obj = Path(path_str).expanduser()
 
+        # Reject symlinked components up front; the LRU cache amortizes the
+        # lstat walk across repeated accesses
+        self._reject_symlinks(path_obj)
+
         # For read operations, path must exist to resolve symlinks properly
         # For write operations, parent must be within bounds (file may not exist yet)
         if require_write:
@@ -104,12 +190,11 @@ class Config:
                 raise FileNotFoundError(f"Path not found: {path_str}")
             requested = path_obj.resolve()
 
-        # Find which allowed directory contains this path
-        for allowed_dir, permission in self.allowed_paths.items():
-            try:
-                # Check if requested path is within allowed_dir
-                requested.relative_to(allowed_dir)
-
+        # Find which allowed directory contains this path (prefix compare
+        # against the precomputed strings, one C-level check per entry)
+        requested_str = str(requested)
+        for prefix, exact, allowed_dir, permission in self._allowed_prefixes:
+            if requested_str == exact or requested_str.startswith(prefix):
                 # Check write permission if needed
                 if require_write and permission == "ro":
                     raise PermissionError(
@@ -119,14 +204,15 @@ class Config:
                 # Valid path within allowed directory
                 return requested
 
-            except ValueError:
-                # Not relative to this allowed_dir, try next
-                continue
-
         # No allowed directory matched - provide helpful hint
-        allowed_list = ", ".join(str(p) for p in self.allowed_paths.keys())
         raise PermissionError(
             f"Access denied: '{path_str}' resolves to '{requested}' "
             f"which is outside allowed directories. "
-            f"Allowed paths: {allowed_list}"
+            f"Allowed paths: {self._allowed_list_msg}"
         )
+
+
+@functools.cache
+def get_config() -> Config:
+    """Return the process-wide Config singleton, constructed on first use."""
+    return Config()
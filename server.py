@@ -2,13 +2,38 @@
 """Filesystem MCP Server - provides filesystem access to Claude Desktop."""
 
 from mcp.server.fastmcp import FastMCP
+import asyncio
+import codecs
+import json
+import os
+import stat
 import sys
+import tempfile
+from operator import attrgetter
 from pathlib import Path
-from config import Config
+from config import get_config
+
+# Chunk size for incremental file reads
+READ_CHUNK_SIZE = 256 * 1024
+
+# Cap on total entries emitted by list_directory_tree, guarding against
+# runaway allocations on huge trees
+MAX_TREE_NODES = 10000
+
+# Prefer orjson (Rust serializer, ~5-10x faster with native indent support)
+# when installed, fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, indent=2)
 
 # Initialize MCP server and config
 mcp = FastMCP("filesystem")
-config = Config()
+config = get_config()
 
 @mcp.tool()
 async def get_allowed_paths() -> str:
@@ -17,9 +42,6 @@ async def get_allowed_paths() -> str:
     Returns:
         JSON object with home directory and allowed paths with permissions
     """
-    import json
-    import os
-
     result = {
         "home": str(Path.home()),
         "allowed_paths": []
@@ -31,7 +53,7 @@ async def get_allowed_paths() -> str:
             "permission": "read-write" if permission == "rw" else "read-only"
         })
 
-    return json.dumps(result, indent=2)
+    return _json_dumps(result)
 
 @mcp.tool()
 async def read_file(path: str) -> str:
@@ -48,30 +70,62 @@ async def read_file(path: str) -> str:
         FileNotFoundError: File doesn't exist
         ValueError: File too large or binary file
     """
-    # Validate path is within allowed directories
-    file_path = config.validate_path(path, require_write=False)
+    def _read() -> str:
+        # Validate path is within allowed directories
+        file_path = config.validate_path(path, require_write=False)
 
-    if not file_path.exists():
-        raise FileNotFoundError(f"File not found: {path}")
+        # One stat answers existence, type and size
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            raise FileNotFoundError(f"File not found: {path}")
 
-    if not file_path.is_file():
-        raise FileNotFoundError(f"Not a file: {path}")
+        if not stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(f"Not a file: {path}")
 
-    # Check size limit
-    if config.max_file_size_bytes:
-        size = file_path.stat().st_size
-        if size > config.max_file_size_bytes:
-            max_mb = config.max_file_size_bytes / (1024 * 1024)
-            size_mb = size / (1024 * 1024)
+        if config.max_file_size_bytes and st.st_size > config.max_file_size_bytes:
+            size_mb = st.st_size / (1024 * 1024)
             raise ValueError(
-                f"File too large: {size_mb:.1f}MB (limit: {max_mb:.0f}MB)"
+                f"File too large: {size_mb:.1f}MB (limit: {config.max_file_size_mb}MB)"
             )
 
-    # Read and return file contents
-    try:
-        return file_path.read_text()
-    except UnicodeDecodeError:
-        raise ValueError(f"Cannot read binary file: {path}. Only text files supported.")
+        # Read in chunks, decoding incrementally: binary files fail on the
+        # first bad chunk and oversize files stop reading as soon as the limit
+        # is hit, instead of buffering (and decoding) the whole file first.
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        chunks = []
+        total = 0
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            while True:
+                buf = os.read(fd, READ_CHUNK_SIZE)
+                if not buf:
+                    break
+                total += len(buf)
+                if config.max_file_size_bytes and total > config.max_file_size_bytes:
+                    raise ValueError(
+                        f"File too large: exceeds limit of {config.max_file_size_mb}MB"
+                    )
+                try:
+                    chunks.append(decoder.decode(buf))
+                except UnicodeDecodeError:
+                    raise ValueError(
+                        f"Cannot read binary file: {path}. Only text files supported."
+                    )
+            try:
+                chunks.append(decoder.decode(b"", final=True))
+            except UnicodeDecodeError:
+                raise ValueError(
+                    f"Cannot read binary file: {path}. Only text files supported."
+                )
+        finally:
+            os.close(fd)
+
+        return "".join(chunks)
+
+    # Run blocking I/O in a worker thread so the event loop stays free to
+    # service other tool calls
+    return await asyncio.to_thread(_read)
 
 
 @mcp.tool()
@@ -91,28 +145,52 @@ async def write_file(path: str, content: str) -> str:
         PermissionError: Path outside allowed directories or read-only
         ValueError: Content too large
     """
-    # Validate path with write permission required
-    file_path = config.validate_path(path, require_write=True)
-
-    # Check size limit
-    content_bytes = content.encode('utf-8')
-    size = len(content_bytes)
-
-    if config.max_file_size_bytes:
-        if size > config.max_file_size_bytes:
-            max_mb = config.max_file_size_bytes / (1024 * 1024)
-            size_mb = size / (1024 * 1024)
-            raise ValueError(
-                f"Content too large: {size_mb:.1f}MB (limit: {max_mb:.0f}MB)"
-            )
-
-    # Create parent directories if needed
-    file_path.parent.mkdir(parents=True, exist_ok=True)
+    def _write() -> str:
+        # Validate path with write permission required
+        file_path = config.validate_path(path, require_write=True)
+
+        # Check size limit
+        content_bytes = content.encode('utf-8')
+        size = len(content_bytes)
+
+        if config.max_file_size_bytes:
+            if size > config.max_file_size_bytes:
+                size_mb = size / (1024 * 1024)
+                raise ValueError(
+                    f"Content too large: {size_mb:.1f}MB (limit: {config.max_file_size_mb}MB)"
+                )
+
+        # Create parent directories if needed
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write the already-encoded bytes to a temp file and rename into
+        # place: one copy through Python instead of write_text's re-encode,
+        # and readers never observe a partially written file. mkstemp gives
+        # each writer its own O_EXCL-created file in the target directory, so
+        # concurrent writes to the same path can't truncate or unlink each
+        # other's temp file and can't be redirected by a planted symlink.
+        fd, tmp_name = tempfile.mkstemp(dir=file_path.parent)
+        try:
+            # mkstemp creates 0o600; widen to the usual 0o644 before the
+            # rename makes it the visible file (chmod, not fchmod, so this
+            # also works on Windows)
+            os.chmod(tmp_name, 0o644)
+            view = memoryview(content_bytes)
+            while view:
+                view = view[os.write(fd, view):]
+        except BaseException:
+            os.close(fd)
+            os.unlink(tmp_name)
+            raise
+        else:
+            os.close(fd)
+        os.replace(tmp_name, file_path)
 
-    # Write file
-    file_path.write_text(content)
+        return f"Wrote {size} bytes to {path}"
 
-    return f"Wrote {size} bytes to {path}"
+    # Run blocking I/O in a worker thread so the event loop stays free to
+    # service other tool calls
+    return await asyncio.to_thread(_write)
 
 
 @mcp.tool()
@@ -129,27 +207,39 @@ async def list_directory(path: str) -> str:
         PermissionError: Path outside allowed directories
         NotADirectoryError: Path is not a directory
     """
-    import json
+    def _list() -> str:
+        # Validate path is within allowed directories
+        dir_path = config.validate_path(path, require_write=False)
 
-    # Validate path is within allowed directories
-    dir_path = config.validate_path(path, require_write=False)
-
-    if not dir_path.exists():
-        raise FileNotFoundError(f"Directory not found: {path}")
+        # One stat answers both existence and type
+        try:
+            st = os.stat(dir_path)
+        except OSError:
+            raise FileNotFoundError(f"Directory not found: {path}")
+
+        if not stat.S_ISDIR(st.st_mode):
+            raise NotADirectoryError(f"Not a directory: {path}")
+
+        # List directory contents via scandir: DirEntry carries the file type
+        # from the directory read itself, avoiding a stat() per entry. Sort
+        # the entries by name (C-level attrgetter, short compare keys) before
+        # building the output dicts.
+        with os.scandir(dir_path) as it:
+            entries_raw = sorted(it, key=attrgetter("name"))
+
+        entries = [
+            {
+                "name": entry.name,
+                "type": "dir" if entry.is_dir(follow_symlinks=False) else "file",
+            }
+            for entry in entries_raw
+        ]
 
-    if not dir_path.is_dir():
-        raise NotADirectoryError(f"Not a directory: {path}")
+        return _json_dumps(entries)
 
-    # List directory contents
-    entries = []
-    for item in sorted(dir_path.iterdir()):
-        entry_type = "dir" if item.is_dir() else "file"
-        entries.append({
-            "name": item.name,
-            "type": entry_type
-        })
-
-    return json.dumps(entries, indent=2)
+    # Run blocking I/O in a worker thread so the event loop stays free to
+    # service other tool calls
+    return await asyncio.to_thread(_list)
 
 
 @mcp.tool()
@@ -167,53 +257,99 @@ async def list_directory_tree(path: str, max_depth: int = 3) -> str:
         PermissionError: Path outside allowed directories
         NotADirectoryError: Path is not a directory
     """
-    import json
-
-    # Validate path is within allowed directories
-    dir_path = config.validate_path(path, require_write=False)
-
-    if not dir_path.exists():
-        raise FileNotFoundError(f"Directory not found: {path}")
-
-    if not dir_path.is_dir():
-        raise NotADirectoryError(f"Not a directory: {path}")
-
     # Clamp max_depth to reasonable limits
     max_depth = max(1, min(max_depth, 10))
 
-    def build_tree(current_path: Path, current_depth: int) -> dict:
-        """Recursively build directory tree."""
-        if current_depth > max_depth:
-            return {
-                "name": current_path.name,
-                "type": "dir",
-                "truncated": True
-            }
-
-        result = {
-            "name": current_path.name,
-            "type": "dir",
-            "children": []
-        }
-
-        try:
-            for item in sorted(current_path.iterdir()):
-                if item.is_symlink():
-                    continue  # Skip symlinks to prevent traversal issues
-                if item.is_dir():
-                    result["children"].append(build_tree(item, current_depth + 1))
+    def emit_tree(root_path: Path, out: list):
+        """Emit JSON tokens for the tree directly into out.
+
+        Streams the serialized tree with an explicit stack of directory
+        frames: no nested dict graph, no Python frame per directory, no
+        RecursionError on deep trees. Directories past max_depth and any
+        frame still open after MAX_TREE_NODES entries are marked
+        \"truncated\": true.
+        """
+        nodes = 0
+
+        def open_frame(dir_path: Path, depth: int, pad: str) -> list:
+            """Emit a directory node header and return its mutable frame."""
+            out.append(
+                f'{{\n{pad}  "name": {json.dumps(dir_path.name)},\n'
+                f'{pad}  "type": "dir",\n{pad}  "children": ['
+            )
+            denied = False
+            items = []
+            try:
+                with os.scandir(dir_path) as it:
+                    items = sorted(it, key=attrgetter("name"))
+            except PermissionError:
+                denied = True
+            # [path, depth, pad, items, next index, first-child flag, denied]
+            return [dir_path, depth, pad, items, 0, True, denied]
+
+        stack = [open_frame(root_path, 0, "")]
+        while stack:
+            frame = stack[-1]
+            dir_path, depth, pad, items, idx, first, denied = frame
+
+            if idx >= len(items) or nodes >= MAX_TREE_NODES:
+                # Close this directory node
+                out.append("]" if first else f"\n{pad}  ]")
+                if denied:
+                    out.append(f',\n{pad}  "error": "Permission denied"')
+                if idx < len(items):
+                    out.append(f',\n{pad}  "truncated": true')
+                out.append(f"\n{pad}}}")
+                stack.pop()
+                continue
+
+            frame[4] = idx + 1
+            item = items[idx]
+            if item.is_symlink():
+                continue  # Skip symlinks to prevent traversal issues
+
+            child_pad = pad + "    "
+            out.append("\n" + child_pad if first else ",\n" + child_pad)
+            frame[5] = False
+            nodes += 1
+
+            if item.is_dir(follow_symlinks=False):
+                if depth + 1 > max_depth:
+                    out.append(
+                        f'{{\n{child_pad}  "name": {json.dumps(item.name)},\n'
+                        f'{child_pad}  "type": "dir",\n'
+                        f'{child_pad}  "truncated": true\n{child_pad}}}'
+                    )
                 else:
-                    result["children"].append({
-                        "name": item.name,
-                        "type": "file"
-                    })
-        except PermissionError:
-            result["error"] = "Permission denied"
+                    stack.append(
+                        open_frame(dir_path / item.name, depth + 1, child_pad)
+                    )
+            else:
+                out.append(
+                    f'{{\n{child_pad}  "name": {json.dumps(item.name)},\n'
+                    f'{child_pad}  "type": "file"\n{child_pad}}}'
+                )
+
+    def _tree() -> str:
+        # Validate path is within allowed directories
+        dir_path = config.validate_path(path, require_write=False)
+
+        # One stat answers both existence and type
+        try:
+            st = os.stat(dir_path)
+        except OSError:
+            raise FileNotFoundError(f"Directory not found: {path}")
 
-        return result
+        if not stat.S_ISDIR(st.st_mode):
+            raise NotADirectoryError(f"Not a directory: {path}")
 
-    tree = build_tree(dir_path, 0)
-    return json.dumps(tree, indent=2)
+        out: list = []
+        emit_tree(dir_path, out)
+        return "".join(out)
+
+    # Run blocking I/O in a worker thread so the event loop stays free to
+    # service other tool calls
+    return await asyncio.to_thread(_tree)
 
 @mcp.tool()
 async def search_directories(name: str, max_depth: int = 3) -> str:
@@ -229,8 +365,6 @@ async def search_directories(name: str, max_depth: int = 3) -> str:
     Raises:
         PermissionError: If allowed paths not configured
     """
-    import json
-
     if not config.allowed_paths:
         raise PermissionError("No allowed paths configured")
 
@@ -260,11 +394,16 @@ async def search_directories(name: str, max_depth: int = 3) -> str:
         except PermissionError:
             pass  # Skip directories we can't read
 
-    # Search within each allowed directory
-    for allowed_path in config.allowed_paths.keys():
-        search_recursive(allowed_path, 0)
+    def _search() -> str:
+        # Search within each allowed directory
+        for allowed_path in config.allowed_paths.keys():
+            search_recursive(allowed_path, 0)
 
-    return json.dumps({"matches": matches, "count": len(matches)}, indent=2)
+        return _json_dumps({"matches": matches, "count": len(matches)})
+
+    # Run blocking I/O in a worker thread so the event loop stays free to
+    # service other tool calls
+    return await asyncio.to_thread(_search)
 
 
 if __name__ == "__main__":
@@ -275,11 +414,7 @@ if __name__ == "__main__":
         for path, perm in config.allowed_paths.items():
             print(f"  {path} ({perm})", file=sys.stderr)
 
-        if config.no_size_limit:
-            print("Size limit: DISABLED", file=sys.stderr)
-        else:
-            max_mb = config.max_file_size_bytes / (1024 * 1024)
-            print(f"Size limit: {max_mb:.0f}MB", file=sys.stderr)
+        print(f"Size limit: {config.size_limit_desc}", file=sys.stderr)
 
         print("", file=sys.stderr)
 